@@ -1,3 +1,9 @@
+import json
+import os
+import signal
+import sys
+import tempfile
+import weakref
 from intbase import InterpreterBase, ErrorType
 import bparser as b
 
@@ -106,23 +112,73 @@ class BrewinMethod:
 
         return result
 
+class HeapStats:
+    def __init__(self):
+        self.classes = {}
+
+    def _class_stats(self, class_name):
+        stats = self.classes.get(class_name)
+        if stats is None:
+            stats = {"live": 0, "total": 0, "peak_live": 0, "total_bytes": 0, "sites": {}}
+            self.classes[class_name] = stats
+        return stats
+
+    def record_allocation(self, instance, line_num=None):
+        stats = self._class_stats(instance.name)
+        stats["live"] += 1
+        stats["total"] += 1
+        stats["peak_live"] = max(stats["peak_live"], stats["live"])
+        stats["total_bytes"] += sys.getsizeof(instance) + sys.getsizeof(instance.__dict__) + sys.getsizeof(instance.fields) + sys.getsizeof(instance.methods)
+        # the parser numbers lines from 0; sites are reported as source lines
+        site = str(line_num + 1) if line_num is not None else "unknown"
+        stats["sites"][site] = stats["sites"].get(site, 0) + 1
+        weakref.finalize(instance, self._record_free, instance.name)
+
+    def _record_free(self, class_name):
+        self.classes[class_name]["live"] -= 1
+
+    def get_stats(self):
+        return {
+            class_name: {
+                "live": stats["live"],
+                "total": stats["total"],
+                "peak_live": stats["peak_live"],
+                "approx_bytes_per_instance": stats["total_bytes"] // stats["total"],
+                "sites": dict(stats["sites"]),
+            }
+            for class_name, stats in self.classes.items()
+        }
+
+    def dump(self, path):
+        # write to a temp file first so readers never see a partial dump
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.get_stats(), f, indent=2, sort_keys=True)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
 class Interpreter(InterpreterBase):
 
-    def __init__(self, console_output=True, inp=None, trace_output=False):
+    def __init__(self, console_output=True, inp=None, trace_output=False, heap_stats=False, heap_stats_path=None):
         super().__init__(console_output=console_output, inp=inp)
         self.trace_output = trace_output
+        # allocation tracking for objects created by new; off unless asked for
+        self.heap_stats = HeapStats() if heap_stats or heap_stats_path else None
+        self.heap_stats_path = heap_stats_path
         self.classes = {}
+        self.class_forms = {}
+        self.initial_fields = {}
+        self.parsed_chunks = {}
 
     def run(self, program):
         global currentClass
-        success, parsed_program = b.BParser.parse(program)
-        if not success:
-            super().error(ErrorType.NAME_ERROR, "Parsing failed")
-        try:
-            self._create_definitions(parsed_program)
-        except not super().ErrorType.TYPE_ERROR:
-            super().error(ErrorType.NAME_ERROR, "Error creating definitions from the parsed program")
-        
+        parsed_program = self._parse_program(program)
+        self._create_definitions(parsed_program)
+
         main_class = self.classes.get(MAIN_DEF)
         if not main_class:
             super().error(ErrorType.TYPE_ERROR, "Main class 'main' not found")
@@ -130,9 +186,53 @@ class Interpreter(InterpreterBase):
         if not main_method:
             super().error(ErrorType.TYPE_ERROR, "Main method 'main' not found in main class")
         currentClass = main_class
-        result = main_class.execute_method(MAIN_DEF)
+        try:
+            result = main_class.execute_method(MAIN_DEF)
+        except Exception:
+            # failing to write stats must not hide the program's own error
+            try:
+                self.dump_heap_stats()
+            except OSError:
+                pass
+            raise
+        self.dump_heap_stats()
 
         return result
+
+    def get_heap_stats(self):
+        if self.heap_stats is None:
+            return {}
+        return self.heap_stats.get_stats()
+
+    def reset_heap_stats(self):
+        # instances from earlier runs still report their frees to the old stats
+        if self.heap_stats is not None:
+            self.heap_stats = HeapStats()
+
+    def dump_heap_stats(self, path=None):
+        path = path or self.heap_stats_path
+        if self.heap_stats is None or path is None:
+            return
+        self.heap_stats.dump(path)
+
+    def install_heap_stats_signal(self, signum=getattr(signal, "SIGUSR1", None), path=None):
+        # dump heap stats whenever the process receives signum
+        path = path or self.heap_stats_path
+        if self.heap_stats is None:
+            raise ValueError("Heap stats are not enabled")
+        if path is None:
+            raise ValueError("No path to dump heap stats to")
+        if signum is None:
+            raise ValueError("No signal given and SIGUSR1 is not available")
+        signal.signal(signum, lambda _signum, _frame: self._dump_heap_stats_from_signal(path))
+
+    def _dump_heap_stats_from_signal(self, path):
+        # the handler runs inside whatever code was interrupted, so a failed
+        # dump must not raise into the running program
+        try:
+            self.dump_heap_stats(path)
+        except OSError as e:
+            print(f"Failed to dump heap stats to {path}: {e}", file=sys.stderr)
     
     def interpret_body(self, body, local_scope):
         result = None
@@ -294,6 +394,8 @@ class Interpreter(InterpreterBase):
                     newInstance = BrewinClass(class_name, original_class.parent)
                     newInstance.fields = original_class.fields.copy()
                     newInstance.methods = original_class.methods.copy()
+                    if self.heap_stats is not None:
+                        self.heap_stats.record_allocation(newInstance, getattr(expression[0], "line_num", None))
                     return newInstance
                 else:
                     super().error(ErrorType.TYPE_ERROR)
@@ -331,11 +433,116 @@ class Interpreter(InterpreterBase):
         else:
             super().error(ErrorType.NAME_ERROR)
 
+    def _parse_program(self, program):
+        # only top-level chunks whose text changed since the previous run are
+        # parsed again; unchanged chunks keep their parsed forms
+        previous_chunks = self.parsed_chunks
+        self.parsed_chunks = {}
+        parsed_program = []
+        for start_line, chunk in self._split_top_level(program):
+            cached = previous_chunks.pop(chunk, None)
+            if cached is None:
+                success, forms = b.BParser.parse(chunk)
+                if not success:
+                    super().error(ErrorType.NAME_ERROR, "Parsing failed")
+                self._shift_line_numbers(forms, start_line)
+            else:
+                cached_start_line, forms = cached
+                self._shift_line_numbers(forms, start_line - cached_start_line)
+            self.parsed_chunks[chunk] = (start_line, forms)
+            parsed_program.extend(forms)
+        return parsed_program
+
+    def _split_top_level(self, program):
+        # groups lines into chunks that start and end at paren depth 0
+        chunks = []
+        chunk = []
+        start_line = 0
+        depth = 0
+        for line_no, line in enumerate(program):
+            if not chunk:
+                if not line.strip():
+                    continue
+                start_line = line_no
+            chunk.append(line)
+            if b.BParser.QUOTE_CHAR in line or b.BParser.COMMENT_CHAR in line:
+                depth += self._paren_depth_change(line)
+            else:
+                depth += line.count(b.BParser.OPEN_PAREN_CHAR) - line.count(b.BParser.CLOSE_PAREN_CHAR)
+            if depth <= 0:
+                chunks.append((start_line, tuple(chunk)))
+                chunk = []
+                depth = 0
+        if chunk:
+            chunks.append((start_line, tuple(chunk)))
+        return chunks
+
+    def _paren_depth_change(self, line):
+        depth_change = 0
+        in_quote = False
+        for char in line:
+            if char == b.BParser.QUOTE_CHAR:
+                in_quote = not in_quote
+            elif in_quote:
+                continue
+            elif char == b.BParser.COMMENT_CHAR:
+                break
+            elif char == b.BParser.OPEN_PAREN_CHAR:
+                depth_change += 1
+            elif char == b.BParser.CLOSE_PAREN_CHAR:
+                depth_change -= 1
+        return depth_change
+
+    def _shift_line_numbers(self, nodes, delta):
+        if delta == 0:
+            return
+        for node in nodes:
+            if isinstance(node, list):
+                self._shift_line_numbers(node, delta)
+            else:
+                node.line_num += delta
+
     def _create_definitions(self, parsed_program):
+        # classes whose parsed form and parent are unchanged since the
+        # previous run are reused as-is; everything else is rebuilt
+        previous = (self.classes, self.class_forms, self.initial_fields)
+        self.classes = {}
+        self.class_forms = {}
+        self.initial_fields = {}
         for line_nodes in parsed_program:
-          self._process_line_nodes(line_nodes)
+            if not line_nodes:
+                continue
+            if line_nodes[0] != CLASS_DEF:
+                super().error(ErrorType.SYNTAX_ERROR, "Only class definitions are allowed at the top level")
+            self._load_class(line_nodes, *previous)
+
+    def _load_class(self, line_nodes, previous_classes, previous_forms, previous_initial_fields):
+        class_name = line_nodes[1]
+        if class_name in self.classes:
+            super().error(ErrorType.TYPE_ERROR)
+        previous_class = previous_classes.get(class_name)
+        parent_class_name, _ = self._get_parent_class_name(line_nodes)
+        parent = self.classes.get(parent_class_name) if parent_class_name else None
+
+        # forms of re-parsed chunks are new lists, and a rebuilt parent is a
+        # new object, so edited classes and their subclasses get rebuilt
+        if previous_class is not None and previous_class.parent is parent and previous_forms.get(class_name) is line_nodes:
+            brewin_class = previous_class
+            # fields on the class object were mutated by the previous run
+            brewin_class.fields = previous_initial_fields[class_name].copy()
+            self.classes[class_name] = brewin_class
+        else:
+            brewin_class = self._process_line_nodes(line_nodes)
+        self.class_forms[class_name] = line_nodes
+        self.initial_fields[class_name] = brewin_class.fields.copy()
+        return brewin_class
 
-    def _process_line_nodes(self, line_nodes):
+    def _get_parent_class_name(self, line_nodes):
+        if len(line_nodes) > 2 and not isinstance(line_nodes[2], list):
+            return line_nodes[2], 3
+        return None, 2
+
+    def _process_line_nodes(self, line_nodes, current_class=None):
         if not line_nodes:
             return
 
@@ -345,28 +552,24 @@ class Interpreter(InterpreterBase):
             class_name = line_nodes[1]
             if class_name in self.classes:
                 super().error(ErrorType.TYPE_ERROR)
-            parent = None
-            if len(line_nodes) > 2 and not isinstance(line_nodes[2], list):
-                parent_class_name = line_nodes[2]
-                parent = self.classes.get(parent_class_name)
-                members_start_index = 3
-            else:
-                members_start_index = 2
-            
+            parent_class_name, members_start_index = self._get_parent_class_name(line_nodes)
+            parent = self.classes.get(parent_class_name) if parent_class_name else None
+
             brewin_class = BrewinClass(class_name, parent)
             self.classes[class_name] = brewin_class
 
             if len(line_nodes) > members_start_index:
                 for member_node in line_nodes[members_start_index:]:
-                    self._process_line_nodes(member_node)
+                    self._process_line_nodes(member_node, brewin_class)
+            return brewin_class
 
         elif node_type == FIELD_DEF:
-            current_class = list(self.classes.values())[-1]
+            if current_class is None:
+                super().error(ErrorType.SYNTAX_ERROR)
             field_name = line_nodes[1]
             if field_name in current_class.get_all_fields():
                 super().error(ErrorType.NAME_ERROR)
             field_value = line_nodes[2]
-            current_class = list(self.classes.values())[-1]
 
             if field_value.isdigit():
                 field_value = int(field_value)
@@ -383,10 +586,8 @@ class Interpreter(InterpreterBase):
             current_class.add_field(field_name, field_value)
 
         elif node_type == METHOD_DEF:
-            if(self.classes is not {}):
-                current_class = list(self.classes.values())[-1]
-            else:
-                raise 
+            if current_class is None:
+                super().error(ErrorType.SYNTAX_ERROR)
             method_name = line_nodes[1]
             if method_name in current_class.get_all_methods():
                 super().error(ErrorType.NAME_ERROR)
@@ -398,7 +599,7 @@ class Interpreter(InterpreterBase):
         elif node_type in (BEGIN_DEF, WHILE_DEF, RETURN_DEF):
             for nested_node in line_nodes[1:]:
                 if isinstance(nested_node, list):
-                    self._process_line_nodes(nested_node)
+                    self._process_line_nodes(nested_node, current_class)
 
         else:
             raise NotImplementedError(f"Node type {node_type} not implemented")
@@ -0,0 +1,210 @@
+import gc
+import json
+import os
+import signal
+import pytest
+
+import bparser
+from interpreterv1 import Interpreter
+
+PROGRAM = """
+(class base
+ (field x 1)
+ (method get () (return 3)))
+(class child base
+ (method get_two () (return 2)))
+(class main
+ (field y 5)
+ (method main ()
+  (begin
+   (print "y=" y)
+   (set y 7)
+   (print "y=" y))))
+""".splitlines()
+
+ALLOCATING_PROGRAM = """(class node
+ (field v 0))
+(class main
+ (field n null)
+ (field i 0)
+ (method main ()
+  (while (< i 3)
+   (begin
+    (set n (new node))
+    (set i (+ i 1))))))
+""".splitlines()
+
+
+def run_program(interpreter, program):
+    interpreter.reset()
+    interpreter.run(program)
+    return interpreter.get_output()
+
+
+def make_large_program(class_count):
+    program = []
+    for i in range(class_count):
+        program += [
+            f"(class c{i}",
+            f" (field v{i} {i})",
+            f" (method get () (return v{i})))",
+        ]
+    program += [
+        "(class main",
+        " (method main ()",
+        '  (print "done")))',
+    ]
+    return program
+
+
+def test_rerun_reuses_unchanged_classes():
+    interpreter = Interpreter(console_output=False)
+    run_program(interpreter, PROGRAM)
+    classes = dict(interpreter.classes)
+    run_program(interpreter, PROGRAM)
+    for name, brewin_class in classes.items():
+        assert interpreter.classes[name] is brewin_class
+
+
+def test_edited_parent_rebuilds_subclasses():
+    interpreter = Interpreter(console_output=False)
+    run_program(interpreter, PROGRAM)
+    classes = dict(interpreter.classes)
+    run_program(interpreter, [line.replace("(field x 1)", "(field x 2)") for line in PROGRAM])
+    assert interpreter.classes["base"] is not classes["base"]
+    assert interpreter.classes["child"] is not classes["child"]
+    assert interpreter.classes["child"].parent is interpreter.classes["base"]
+    assert interpreter.classes["main"] is classes["main"]
+
+
+def test_fields_are_reset_between_runs():
+    interpreter = Interpreter(console_output=False)
+    assert run_program(interpreter, PROGRAM) == ["y=5", "y=7"]
+    assert run_program(interpreter, PROGRAM) == ["y=5", "y=7"]
+
+
+def test_moved_class_gets_current_line_numbers():
+    interpreter = Interpreter(console_output=False)
+    run_program(interpreter, PROGRAM)
+    main_class = interpreter.classes["main"]
+    run_program(interpreter, ["", "", ""] + PROGRAM)
+    assert interpreter.classes["main"] is main_class
+
+    fresh = Interpreter(console_output=False)
+    run_program(fresh, ["", "", ""] + PROGRAM)
+    reused_body = main_class.get_method("main").body
+    fresh_body = fresh.classes["main"].get_method("main").body
+    assert reused_body[0][1][1].line_num == fresh_body[0][1][1].line_num
+
+
+def test_top_level_members_are_rejected():
+    interpreter = Interpreter(console_output=False)
+    with pytest.raises(RuntimeError, match="SYNTAX_ERROR"):
+        interpreter.run(PROGRAM + ["(method stray () (return 1))"])
+
+
+def test_rerun_after_small_edit_only_reparses_changed_chunk(monkeypatch):
+    program = make_large_program(1667)
+    interpreter = Interpreter(console_output=False)
+    run_program(interpreter, program)
+    classes = dict(interpreter.classes)
+
+    parsed_chunks = []
+    parse = bparser.BParser.parse
+    monkeypatch.setattr(bparser.BParser, "parse", lambda lines: parsed_chunks.append(lines) or parse(lines))
+    program[1] = " (field v0 100)"
+    run_program(interpreter, program)
+
+    assert parsed_chunks == [tuple(program[0:3])]
+    rebuilt = [name for name, brewin_class in interpreter.classes.items() if brewin_class is not classes[name]]
+    assert rebuilt == ["c0"]
+
+
+def test_heap_stats_are_off_by_default():
+    interpreter = Interpreter(console_output=False)
+    run_program(interpreter, ALLOCATING_PROGRAM)
+    assert interpreter.get_heap_stats() == {}
+
+
+def test_heap_stats_count_allocations(tmp_path):
+    path = tmp_path / "heap.json"
+    interpreter = Interpreter(console_output=False, heap_stats_path=str(path))
+    run_program(interpreter, ALLOCATING_PROGRAM)
+    gc.collect()
+
+    stats = interpreter.get_heap_stats()["node"]
+    assert stats["live"] == 1
+    assert stats["total"] == 3
+    assert stats["peak_live"] == 2
+    assert stats["approx_bytes_per_instance"] > 0
+    assert stats["sites"] == {"9": 3}
+    assert json.loads(path.read_text())["node"]["total"] == 3
+
+
+def test_reset_heap_stats():
+    interpreter = Interpreter(console_output=False, heap_stats=True)
+    run_program(interpreter, ALLOCATING_PROGRAM)
+    run_program(interpreter, ALLOCATING_PROGRAM)
+    assert interpreter.get_heap_stats()["node"]["total"] == 6
+    interpreter.reset_heap_stats()
+    assert interpreter.get_heap_stats() == {}
+    run_program(interpreter, ALLOCATING_PROGRAM)
+    assert interpreter.get_heap_stats()["node"]["total"] == 3
+
+
+def test_heap_stats_dump_failure_keeps_program_error(tmp_path):
+    path = tmp_path / "missing" / "heap.json"
+    interpreter = Interpreter(console_output=False, heap_stats_path=str(path))
+    program = [line.replace("(new node)", "(new nosuchclass)") for line in ALLOCATING_PROGRAM]
+    with pytest.raises(RuntimeError, match="TYPE_ERROR"):
+        interpreter.run(program)
+
+
+class SignallingInterpreter(Interpreter):
+    # sends SIGUSR1 to itself after the first new, i.e. in the middle of a run
+    signalled = False
+
+    def evaluate_expression(self, expression, local_scope):
+        result = super().evaluate_expression(expression, local_scope)
+        if isinstance(expression, list) and expression[0] == "new" and not self.signalled:
+            self.signalled = True
+            os.kill(os.getpid(), signal.SIGUSR1)
+        return result
+
+
+SIGNALLING_PROGRAM = [line.replace("(set i (+ i 1))", '(set i (+ i 1)) (print i)') for line in ALLOCATING_PROGRAM]
+
+
+@pytest.fixture
+def restore_sigusr1():
+    if not hasattr(signal, "SIGUSR1"):
+        pytest.skip("SIGUSR1 is not available")
+    handler = signal.getsignal(signal.SIGUSR1)
+    yield
+    signal.signal(signal.SIGUSR1, handler)
+
+
+def test_heap_stats_signal_dumps_mid_run(tmp_path, restore_sigusr1):
+    path = tmp_path / "heap.json"
+    interpreter = SignallingInterpreter(console_output=False, heap_stats=True)
+    interpreter.install_heap_stats_signal(path=str(path))
+    assert run_program(interpreter, SIGNALLING_PROGRAM) == ["1", "2", "3"]
+    assert json.loads(path.read_text())["node"]["total"] == 1
+    assert os.listdir(tmp_path) == ["heap.json"]
+
+
+def test_heap_stats_signal_dump_failure_does_not_affect_run(tmp_path, restore_sigusr1, capsys):
+    path = tmp_path / "missing" / "heap.json"
+    interpreter = SignallingInterpreter(console_output=False, heap_stats=True)
+    interpreter.install_heap_stats_signal(path=str(path))
+    assert run_program(interpreter, SIGNALLING_PROGRAM) == ["1", "2", "3"]
+    assert interpreter.get_error_type_and_line() == (None, None)
+    assert "Failed to dump heap stats" in capsys.readouterr().err
+
+
+def test_heap_stats_signal_requires_stats_and_path(restore_sigusr1):
+    with pytest.raises(ValueError):
+        Interpreter(console_output=False).install_heap_stats_signal(path="heap.json")
+    with pytest.raises(ValueError):
+        Interpreter(console_output=False, heap_stats=True).install_heap_stats_signal()
+    assert signal.getsignal(signal.SIGUSR1) == signal.SIG_DFL